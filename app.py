@@ -1,4 +1,4 @@
-from flask import Flask, render_template, request, redirect, url_for, session, jsonify, make_response
+from flask import Flask, render_template, stream_template, stream_with_context, request, redirect, url_for, session, jsonify, make_response, Response
 import mysql.connector
 import io, csv
 from datetime import datetime
@@ -9,13 +9,14 @@ app.config["TEMPLATES_AUTO_RELOAD"] = True
 app.secret_key = "skift_mig_til_noget_unikt_og_hemmeligt"
 
 # ----- DB -----
-def get_db_connection():
+def get_db_connection(**kwargs):
     return mysql.connector.connect(
         host="localhost",
         user="root",
         password="studielink",       # <- skift hvis nødvendigt
         database="studielink",
-        auth_plugin="mysql_native_password"
+        auth_plugin="mysql_native_password",
+        **kwargs
     )
 
 # Hvilke kolonner må opdateres via admin-API (i hovedtal_2025)
@@ -24,6 +25,11 @@ ALLOWED_COLUMNS = {
     "ansogninger_ialt", "1_priotitet_ans", "adgangskvotient", "standby_kvotient"
 }
 
+# Streaming af "medtag alle": mindste bid (i tegn) der sendes ad gangen,
+# og markøren i index.html hvor header + formular sendes med det samme
+STREAM_BIDSTOERRELSE = 4096
+STREAM_FLUSH = "<!-- flush -->"
+
 # Hjælpere til parsing/visning
 def parse_kvot_val(v):
     """Returnér float for kvotient. 'Alle optaget' / 'Ledige pladser' → 2.0.
@@ -70,6 +76,89 @@ def skaler_absolut(v):
         return 0
     return max(0, min(100, (v - 2.0) / (12.7 - 2.0) * 100))
 
+def berig_resultat(r, gennemsnit):
+    """Tilføj visningsfelter (kvotient, diff, tekst, kategori, bjælke) til en række."""
+    kvot = parse_kvot_val(r.get("adgangskvotient"))
+    # Formater til visning
+    if kvot is not None:
+        r["adgangskvotient"] = f"{kvot:.1f}".replace('.', ',')
+
+    diff = None if kvot is None else round(gennemsnit - kvot, 1)
+    r["diff"] = diff
+    if kvot is None:
+        r["adgangskvotient"] = "Åbent optag"
+
+    if diff is None:
+        r["tekst"] = "Åbent optag (ingen grænse)"
+        r["kategori"] = "grøn"
+    else:
+        if diff <= -0.6:
+            r["tekst"] = f"Langt fra – mangler {abs(diff)} point"
+            r["kategori"] = "rød"
+        elif -0.5 <= diff < -0.1:
+            r["tekst"] = f"Tæt på – mangler {abs(diff)} point"
+            r["kategori"] = "orange"
+        elif -0.1 <= diff <= 0.0:
+            r["tekst"] = "Spot on!"
+            r["kategori"] = "gul"
+        elif 0.1 <= diff <= 0.5:
+            r["tekst"] = f"Lidt over grænsen med {abs(diff)} point"
+            r["kategori"] = "lysegrøn"
+        elif diff >= 0.6:
+            r["tekst"] = f"Sikkert optaget – {abs(diff)} point over grænsen"
+            r["kategori"] = "grøn"
+
+    r["bredde"] = skaler_absolut(gennemsnit)
+    r["markering"] = skaler_absolut(kvot if kvot is not None else 2.0)
+    return r
+
+def hent_resultater(sql, params, gennemsnit, medtag_alle):
+    """Generator der først åbner forbindelsen og kører forespørgslen, når den
+       første række bliver bedt om, og derefter beriger én række ad gangen
+       fra en ubufret cursor. Cursor og forbindelse lukkes, når rækkerne er
+       brugt op, eller når generatoren lukkes (fx hvis klienten afbryder).
+       Fejler forespørgslen undervejs, logges fejlen, og der returneres en
+       række med 'fejl' – ved streaming er status og header allerede sendt,
+       så siden skal kunne afsluttes pænt i stedet for at blive kappet over."""
+    # consume_results: ulæste rækker smides væk ved close() i stedet for at fejle
+    conn = get_db_connection(consume_results=True)
+    cursor = conn.cursor(dictionary=True)
+    try:
+        cursor.execute(sql, params)
+        for r in cursor:
+            kvot = parse_kvot_val(r.get("adgangskvotient"))
+            # Hvis vi ikke medtager alle: filtrér væk rækker der ligger >0,5 over, når kvot er tal
+            if not medtag_alle and kvot is not None and kvot > (gennemsnit + 0.5):
+                continue
+            yield berig_resultat(r, gennemsnit)
+    except Exception:
+        app.logger.exception("Fejl under hentning af resultater")
+        yield {"fejl": "Noget gik galt under hentningen af uddannelser – prøv igen om lidt."}
+    finally:
+        # en afbrudt forbindelse må ikke vælte siden, når den lukkes
+        try:
+            cursor.close()
+        except mysql.connector.Error:
+            pass
+        conn.close()
+
+def i_bidder(dele, min_tegn=STREAM_BIDSTOERRELSE):
+    """Saml de mange små stykker fra stream_template til bidder på mindst
+       min_tegn tegn, så der ikke sendes en chunk pr. template-tag.
+       Ved STREAM_FLUSH sendes bufferen straks (header + formular)."""
+    buf, n = [], 0
+    for d in dele:
+        flush = STREAM_FLUSH in d
+        if flush:
+            d = d.replace(STREAM_FLUSH, "")
+        buf.append(d)
+        n += len(d)
+        if flush or n >= min_tegn:
+            yield "".join(buf)
+            buf, n = [], 0
+    if buf:
+        yield "".join(buf)
+
 
 # =========================
 #        Forside
@@ -77,6 +166,7 @@ def skaler_absolut(v):
 @app.route('/', methods=['GET', 'POST'])
 def index():
     resultater = []
+    raekker = None
     fejl = None
     gennemsnit = None
     medtag_alle = False
@@ -85,6 +175,17 @@ def index():
     valgt_institution = request.form.get('institution', '')
     valgt_by = request.form.get('by', '')
 
+    # dropdown-data til formularen (fra udbud_2025) – hentes før resultaterne,
+    # så forbindelsen er lukket igen, inden en evt. stream holder en åben
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT DISTINCT `Ejerinstitution` FROM udbud_2025 WHERE `Ejerinstitution` IS NOT NULL AND `Ejerinstitution`<>'' ORDER BY `Ejerinstitution`;")
+    institutioner = [x[0] for x in cur.fetchall()]
+    cur.execute("SELECT DISTINCT `Foregar_pa_by` FROM udbud_2025 WHERE `Foregar_pa_by` IS NOT NULL AND `Foregar_pa_by`<>'' ORDER BY `Foregar_pa_by`;")
+    byer = [x[0] for x in cur.fetchall()]
+    cur.close()
+    conn.close()
+
     if request.method == 'POST':
         raw = request.form.get('gennemsnit', '').replace(',', '.').strip()
         medtag_alle = 'medtag_alle' in request.form
@@ -98,9 +199,6 @@ def index():
             fejl = "Karakter skal være mellem 2 og 12,7."
 
         if fejl is None:
-            conn = get_db_connection()
-            cursor = conn.cursor(dictionary=True)
-
             # JOIN: hovedtal_2025 (h) + udbud_2025 (u) + uddannelser_2025 (ud)
             base = """
                 SELECT 
@@ -132,61 +230,37 @@ def index():
             # sortér på kvotient (numerisk) og navn
             base += " ORDER BY h.`adgangskvotient` DESC, navn ASC"
 
-            cursor.execute(base, params)
-            rows = cursor.fetchall()
-            cursor.close()
-            conn.close()
-
-            # Berig rækkerne
-            for r in rows:
-                kvot = parse_kvot_val(r.get("adgangskvotient"))
-                # Formater til visning
-                if kvot is not None:
-                    r["adgangskvotient"] = f"{kvot:.1f}".replace('.', ',')
-
-                # Hvis vi ikke medtager alle: filtrér væk rækker der ligger >0,5 over, når kvot er tal
-                if not medtag_alle and kvot is not None and kvot > (gennemsnit + 0.5):
-                    continue
-
-                diff = None if kvot is None else round(gennemsnit - kvot, 1)
-                r["diff"] = diff
-                if kvot is None:
-                    r["adgangskvotient"] = "Åbent optag"
-
-                if diff is None:
-                    r["tekst"] = "Åbent optag (ingen grænse)"
-                    r["kategori"] = "grøn"
-                else:
-                    if diff <= -0.6:
-                        r["tekst"] = f"Langt fra – mangler {abs(diff)} point"
-                        r["kategori"] = "rød"
-                    elif -0.5 <= diff < -0.1:
-                        r["tekst"] = f"Tæt på – mangler {abs(diff)} point"
-                        r["kategori"] = "orange"
-                    elif -0.1 <= diff <= 0.0:
-                        r["tekst"] = "Spot on!"
-                        r["kategori"] = "gul"
-                    elif 0.1 <= diff <= 0.5:
-                        r["tekst"] = f"Lidt over grænsen med {abs(diff)} point"
-                        r["kategori"] = "lysegrøn"
-                    elif diff >= 0.6:
-                        r["tekst"] = f"Sikkert optaget – {abs(diff)} point over grænsen"
-                        r["kategori"] = "grøn"
-
-                r["bredde"] = skaler_absolut(gennemsnit)
-                r["markering"] = skaler_absolut(kvot if kvot is not None else 2.0)
-
-                resultater.append(r)
-
-    # dropdown-data til formularen (fra udbud_2025)
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT DISTINCT `Ejerinstitution` FROM udbud_2025 WHERE `Ejerinstitution` IS NOT NULL AND `Ejerinstitution`<>'' ORDER BY `Ejerinstitution`;")
-    institutioner = [x[0] for x in cur.fetchall()]
-    cur.execute("SELECT DISTINCT `Foregar_pa_by` FROM udbud_2025 WHERE `Foregar_pa_by` IS NOT NULL AND `Foregar_pa_by`<>'' ORDER BY `Foregar_pa_by`;")
-    byer = [x[0] for x in cur.fetchall()]
-    cur.close()
-    conn.close()
+            # Ubufret cursor: rækkerne hentes og beriges én ad gangen,
+            # i stedet for at hele kataloget ligger i hukommelsen
+            if medtag_alle:
+                raekker = hent_resultater(base, params, gennemsnit, medtag_alle)
+            else:
+                resultater = list(hent_resultater(base, params, gennemsnit, medtag_alle))
+
+    # "Medtag alle" giver stort set hele kataloget – stream siden, så
+    # header og formular når frem med det samme (før forespørgslen kører),
+    # og kortene følger efter
+    if raekker is not None:
+        @stream_with_context
+        def svar():
+            try:
+                yield from i_bidder(stream_template(
+                    'index.html',
+                    resultater=raekker,
+                    fejl=fejl,
+                    gennemsnit=gennemsnit,
+                    medtag_alle=medtag_alle,
+                    institutioner=institutioner,
+                    byer=byer,
+                    valgt_institution=valgt_institution,
+                    valgt_by=valgt_by,
+                    mode="normal",
+                    flush_punkt=STREAM_FLUSH
+                ))
+            finally:
+                # luk cursor + forbindelse straks, også hvis klienten afbryder
+                raekker.close()
+        return Response(svar(), mimetype='text/html')
 
     return render_template(
         'index.html',
@@ -0,0 +1,143 @@
+import sys
+import types
+
+import pytest
+
+# app.py importerer mysql.connector ved load – stub den ud, så testene kører uden MySQL
+mysql = types.ModuleType("mysql")
+connector = types.ModuleType("mysql.connector")
+
+
+class Error(Exception):
+    pass
+
+
+connector.Error = Error
+connector.connect = None  # sættes pr. test via monkeypatch
+mysql.connector = connector
+sys.modules.setdefault("mysql", mysql)
+sys.modules.setdefault("mysql.connector", connector)
+
+import app as studielink  # noqa: E402
+
+
+class FakeCursor:
+    def __init__(self, db):
+        self.db = db
+        self.rows = []
+        self.closed = False
+
+    def execute(self, sql, params=None):
+        if "DISTINCT" in sql:
+            self.rows = [("A",), ("B",)]
+            return
+        self.db.log.append("QUERY")
+        if self.db.fejl_ved is not None and self.db.fejl_ved == 0:
+            raise Error("forbindelsen blev afbrudt")
+        self.rows = [
+            {
+                "id": i,
+                "navn": f"Uddannelse {i}",
+                "institution": "Institution",
+                "by_navn": "By",
+                "studiestart": None,
+                "info_link": None,
+                "adgangskvotient": "7.0",
+            }
+            for i in range(self.db.antal)
+        ]
+
+    def fetchall(self):
+        return self.rows
+
+    def __iter__(self):
+        for i, r in enumerate(self.rows):
+            if self.db.fejl_ved is not None and i == self.db.fejl_ved:
+                raise Error("forbindelsen blev afbrudt")
+            yield r
+
+    def close(self):
+        self.closed = True
+
+
+class FakeConnection:
+    def __init__(self, db):
+        self.db = db
+        self.closed = False
+        self.cursors = []
+
+    def cursor(self, **kwargs):
+        cur = FakeCursor(self.db)
+        self.cursors.append(cur)
+        return cur
+
+    def close(self):
+        self.closed = True
+
+
+class FakeDB:
+    def __init__(self, antal=50, fejl_ved=None):
+        self.antal = antal
+        self.fejl_ved = fejl_ved
+        self.log = []
+        self.forbindelser = []
+
+    def connect(self, **kwargs):
+        conn = FakeConnection(self)
+        self.forbindelser.append(conn)
+        return conn
+
+
+@pytest.fixture
+def db(monkeypatch):
+    fake = FakeDB()
+    monkeypatch.setattr(studielink.mysql.connector, "connect", fake.connect)
+    return fake
+
+
+@pytest.fixture
+def client():
+    studielink.app.config["TESTING"] = True
+    return studielink.app.test_client()
+
+
+def test_medtag_alle_streamer_formular_foer_forespoergsel(client, db):
+    resp = client.post("/", data={"gennemsnit": "8,0", "medtag_alle": "on"}, buffered=False)
+    bidder = iter(resp.response)
+
+    foerste = next(bidder).decode("utf-8")
+    assert foerste.rstrip().endswith("</form>")
+    assert 'class="card"' not in foerste
+    assert db.log == []
+
+    resten = b"".join(bidder).decode("utf-8")
+    resp.close()
+    assert db.log == ["QUERY"]
+    assert resten.count('class="card"') == 50
+    assert "introtekst" in resten
+    assert resten.rstrip().endswith("</html>")
+    assert all(c.closed for c in db.forbindelser)
+    assert all(cur.closed for c in db.forbindelser for cur in c.cursors)
+
+
+def test_medtag_alle_afbrudt_klient_lukker_forbindelsen(client, db):
+    resp = client.post("/", data={"gennemsnit": "8,0", "medtag_alle": "on"}, buffered=False)
+    bidder = iter(resp.response)
+    next(bidder)
+    next(bidder)
+    resp.close()
+    assert db.log == ["QUERY"]
+    assert all(c.closed for c in db.forbindelser)
+
+
+
+@pytest.mark.parametrize("fejl_ved", [0, 3])
+def test_medtag_alle_db_fejl_afslutter_siden(client, db, fejl_ved):
+    db.fejl_ved = fejl_ved
+    resp = client.post("/", data={"gennemsnit": "8,0", "medtag_alle": "on"})
+    html = resp.get_data(as_text=True)
+    assert resp.status_code == 200
+    assert html.count('class="card"') == fejl_ved + 1
+    assert "Noget gik galt" in html
+    assert html.rstrip().endswith("</html>")
+    assert all(c.closed for c in db.forbindelser)